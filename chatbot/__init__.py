@@ -2,7 +2,18 @@ import logging
 import os
 from flask import Flask
 from .config import Config, config
-from logging.handlers import RotatingFileHandler
+from logging.handlers import MemoryHandler, RotatingFileHandler
+
+
+class SizeCheckedRotatingFileHandler(RotatingFileHandler):
+    """Rotating file handler that skips filesystem checks while under maxBytes"""
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.stream is not None and self.maxBytes > 0:
+            msg = "%s\n" % self.format(record)
+            if self.stream.tell() + len(msg) < self.maxBytes:
+                return False
+        return super().shouldRollover(record)
 
 
 def setup_logging(app: Flask) -> logging.Logger:
@@ -13,23 +24,38 @@ def setup_logging(app: Flask) -> logging.Logger:
     logger = logging.getLogger("chatbot")
     logger.setLevel(log_level)
 
-    # Clear existing handlers
+    # Close and clear existing handlers, flushing any buffered records
+    for handler in logger.handlers:
+        target = getattr(handler, "target", None)
+        handler.close()
+        if target is not None:
+            target.close()
     logger.handlers.clear()
 
     # Console handler
     console_handler = logging.StreamHandler()
     console_handler.setLevel(log_level)
 
-    # File handler with rotation
+    # File handler with rotation, opened on first write
     log_filename = os.environ.get("LOG_FILE", "run.log")
     log_max_size = int(os.environ.get("LOG_MAX_SIZE", str(1 * 1024 * 1024)))  # 1 MB
-    file_handler = RotatingFileHandler(
+    file_handler = SizeCheckedRotatingFileHandler(
         log_filename,
         maxBytes=log_max_size,
         backupCount=int(os.environ.get("LOG_BACKUP_COUNT", "5")),
+        delay=True,
     )
     file_handler.setLevel(log_level)
 
+    # Buffer file records, flushing when full, on errors and at shutdown
+    buffered_handler = MemoryHandler(
+        capacity=int(os.environ.get("LOG_BUFFER_CAPACITY", "1024")),
+        flushLevel=logging.ERROR,
+        target=file_handler,
+        flushOnClose=True,
+    )
+    buffered_handler.setLevel(log_level)
+
     # Create formatters
     detailed_formatter = logging.Formatter(
         "%(asctime)s [%(levelname)s] %(name)s:%(lineno)d - %(message)s"
@@ -41,7 +67,7 @@ def setup_logging(app: Flask) -> logging.Logger:
 
     # Add handlers to logger
     logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    logger.addHandler(buffered_handler)
 
     return logger
 
@@ -77,5 +103,5 @@ def create_app(config_name: str = None) -> Flask:
     def health_check():
         return {"status": "healthy", "service": "lead_generation_bot"}, 200
 
-    logger.info(f"Flask app created with config: {config_name}")
+    logger.info("Flask app created with config: %s", config_name)
     return app
@@ -17,6 +17,7 @@ class Config:
     # File paths
     KNOWLEDGE_BASE_FILE: str = os.environ.get("KNOWLEDGE_BASE_FILE", "knowledge_base")
     INSTRUCTIONS_FILE: str = os.environ.get("INSTRUCTIONS_FILE", "instructions")
+    KB_CACHE_FILE: str = os.environ.get("KB_CACHE_FILE", ".kb_cache.json")
 
     # Logging Configuration
     LOG_LEVEL: str = os.environ.get("LOG_LEVEL", "INFO")
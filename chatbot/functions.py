@@ -2,15 +2,27 @@
 import os
 import io
 import json
-import uuid
+import secrets
+import hashlib
+import tempfile
+import functools
 import traceback
+import httpx
 import requests
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Tuple, List, Dict, Any, Optional
 
 # installed imports
+import orjson
 from openai import OpenAI
 from dotenv import load_dotenv
-from pypdf import PdfReader
+from requests.adapters import HTTPAdapter
+
+try:
+    import pymupdf
+except ImportError:
+    pymupdf = None
+    from pypdf import PdfReader
 
 # local imports
 from . import logger
@@ -21,118 +33,212 @@ load_dotenv()
 
 OPENAI_API_KEY = os.environ["OPENAI_API_KEY"]
 
+# Shared HTTP/2 connection pool for all OpenAI API calls
+http_client = httpx.Client(
+    http2=True,
+    timeout=30.0,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=64),
+)
+
 # Init OpenAI Client
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = OpenAI(api_key=OPENAI_API_KEY, http_client=http_client)
+
+
+def _extract_pdf_text(pdf_data: bytes) -> str:
+    """Extract text from PDF bytes, preferring PyMuPDF and falling back to pypdf"""
+    if pymupdf is not None:
+        # Pages are read serially: PyMuPDF documents are not thread-safe
+        doc = pymupdf.open(stream=pdf_data, filetype="pdf")
+        try:
+            return "\n".join(page.get_text("text") for page in doc)
+        finally:
+            doc.close()
+
+    reader = PdfReader(io.BytesIO(pdf_data))
+    parts = []
+    for page in reader.pages:
+        parts.append(page.extract_text() or "")
+        parts.append("\n")
+    return "".join(parts)
 
 
 def load_instructions_from_file(instructions_file_path: str) -> str:
+    """Load assistant instructions, cached while the file is unchanged"""
+    try:
+        stat = os.stat(instructions_file_path)
+    except OSError:
+        return _load_instructions(instructions_file_path, None, None)
+    return _load_instructions(instructions_file_path, stat.st_mtime_ns, stat.st_size)
+
+
+@functools.lru_cache(maxsize=8)
+def _load_instructions(
+    instructions_file_path: str, mtime_ns: Optional[int], size: Optional[int]
+) -> str:
     """Load assistant instructions from a text file or PDF"""
     try:
         if not os.path.exists(instructions_file_path):
             logger.warning(
-                f"Instructions file {instructions_file_path} not found, using default"
+                "Instructions file %s not found, using default", instructions_file_path
             )
             return "You are a helpful AI assistant."
 
-        # First, try to detect if it's a PDF by reading the first few bytes
+        # Read the file once and detect if it's a PDF from the first few bytes
         with open(instructions_file_path, "rb") as file:
-            header = file.read(5)
-            file.seek(0)
+            data = file.read()
 
-        if header.startswith(b"%PDF-"):
+        if data.startswith(b"%PDF-"):
             # It's a PDF file
             try:
-                reader = PdfReader(instructions_file_path)
-                instructions = ""
-                for page in reader.pages:
-                    instructions += page.extract_text() + "\n"
-
-                instructions = instructions.strip()
+                instructions = _extract_pdf_text(data).strip()
                 if not instructions:
                     logger.warning(
-                        f"PDF file {instructions_file_path} contains no readable text, using default"
+                        "PDF file %s contains no readable text, using default",
+                        instructions_file_path,
                     )
                     return "You are a helpful AI assistant."
 
-                logger.info(f"Loaded instructions from PDF {instructions_file_path}")
+                logger.info("Loaded instructions from PDF %s", instructions_file_path)
                 return instructions
 
             except Exception as e:
-                logger.error(f"Error reading PDF file {instructions_file_path}: {e}")
+                logger.error("Error reading PDF file %s: %s", instructions_file_path, e)
                 return "You are a helpful AI assistant."
         else:
             # Assume it's a text file
             try:
-                with open(instructions_file_path, "r", encoding="utf-8") as file:
-                    instructions = file.read().strip()
-                    if not instructions:
-                        logger.warning(
-                            f"Instructions file {instructions_file_path} is empty, using default"
-                        )
-                        return "You are a helpful AI assistant."
-
-                    logger.info(
-                        f"Loaded instructions from text file {instructions_file_path}"
+                instructions = data.decode("utf-8").strip()
+                if not instructions:
+                    logger.warning(
+                        "Instructions file %s is empty, using default",
+                        instructions_file_path,
                     )
-                    return instructions
+                    return "You are a helpful AI assistant."
+
+                logger.info(
+                    "Loaded instructions from text file %s", instructions_file_path
+                )
+                return instructions
 
             except UnicodeDecodeError:
                 logger.error(
-                    f"File {instructions_file_path} is not a valid text file or PDF"
+                    "File %s is not a valid text file or PDF", instructions_file_path
                 )
                 return "You are a helpful AI assistant."
 
     except Exception as e:
-        logger.error(f"Error reading instructions file {instructions_file_path}: {e}")
+        logger.error(
+            "Error reading instructions file %s: %s", instructions_file_path, e
+        )
         return "You are a helpful AI assistant."
 
 
+def _load_kb_cache() -> Dict[str, List[str]]:
+    """Load the {sha256: [file_id, vector_store_id]} knowledge base cache"""
+    try:
+        with open(Config.KB_CACHE_FILE, "r") as file:
+            cache = json.load(file)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning("Failed to read knowledge base cache: %s", e)
+        return {}
+
+    if not isinstance(cache, dict):
+        logger.warning("Ignoring malformed knowledge base cache")
+        return {}
+    return cache
+
+
+def _valid_kb_cache_entry(entry: Any) -> bool:
+    """Check that a cache entry is a [file_id, vector_store_id] pair of strings"""
+    return (
+        isinstance(entry, list)
+        and len(entry) == 2
+        and all(isinstance(value, str) and value for value in entry)
+    )
+
+
+def _save_kb_cache(digest: str, file_id: str, vector_store_id: str) -> None:
+    """Record the uploaded file and vector store for a knowledge base digest"""
+    cache = _load_kb_cache()
+    cache[digest] = [file_id, vector_store_id]
+
+    # Write to a temp file and swap it in so concurrent readers never see a
+    # partially written cache
+    cache_dir = os.path.dirname(os.path.abspath(Config.KB_CACHE_FILE))
+    try:
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as file:
+                json.dump(cache, file)
+            os.replace(temp_path, Config.KB_CACHE_FILE)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    except Exception as e:
+        logger.warning("Failed to save knowledge base cache: %s", e)
+
+
 def setup_knowledge_base(
     client: OpenAI, knowledge_file_path: str
 ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
     """Setup knowledge base and return tools and tool_resources"""
     if not os.path.exists(knowledge_file_path):
-        logger.warning(f"Knowledge file {knowledge_file_path} not found")
-        return FUNCTION_DESCRIPTIONS, None
+        logger.warning("Knowledge file %s not found", knowledge_file_path)
+        return list(_TOOLS_NO_KB), None
 
     try:
-        # Detect file type and prepare content
+        # Read the file once for hashing, type detection and upload
         with open(knowledge_file_path, "rb") as file:
-            header = file.read(5)
-            file.seek(0)  # Reset file pointer
+            data = file.read()
+
+        # Reuse a previous upload of the same content if it still exists
+        digest = hashlib.sha256(data).hexdigest()
+        cached = _load_kb_cache().get(digest)
+        if cached is not None and not _valid_kb_cache_entry(cached):
+            logger.warning("Ignoring malformed knowledge base cache entry: %s", cached)
+        elif cached is not None:
+            file_id, vector_store_id = cached
+            try:
+                client.beta.vector_stores.retrieve(vector_store_id)
+                logger.info(
+                    "Reusing cached knowledge base %s: file %s, vector store %s",
+                    knowledge_file_path,
+                    file_id,
+                    vector_store_id,
+                )
+                tool_resources = {
+                    "file_search": {"vector_store_ids": [vector_store_id]}
+                }
+                return list(_TOOLS_WITH_KB), tool_resources
+            except Exception as e:
+                logger.warning(
+                    "Cached vector store %s unavailable, re-uploading: %s",
+                    vector_store_id,
+                    e,
+                )
 
-        if header.startswith(b"%PDF-"):
+        # Detect file type and prepare the upload name and content type
+        upload_name = f"{secrets.token_hex(8)}_{os.path.basename(knowledge_file_path)}"
+        if data.startswith(b"%PDF-"):
             # It's a PDF file - upload directly as binary
-            with open(knowledge_file_path, "rb") as knowledge_file:
-                knowledge_doc = io.BytesIO(knowledge_file.read())
-                knowledge_doc.name = (
-                    f"{uuid.uuid4().hex}_{os.path.basename(knowledge_file_path)}.pdf"
-                )
-            logger.info(f"Preparing PDF knowledge base: {knowledge_file_path}")
+            knowledge_doc = (f"{upload_name}.pdf", data, "application/pdf")
+            logger.info("Preparing PDF knowledge base: %s", knowledge_file_path)
 
         else:
-            # It's a text file - convert to proper format for upload
+            # It's a text file - upload as .txt if it decodes as UTF-8
             try:
-                with open(knowledge_file_path, "r", encoding="utf-8") as text_file:
-                    text_content = text_file.read()
-
-                # Create a BytesIO object with the text content
-                knowledge_doc = io.BytesIO(text_content.encode("utf-8"))
-                knowledge_doc.name = (
-                    f"{uuid.uuid4().hex}_{os.path.basename(knowledge_file_path)}.txt"
-                )
-                logger.info(f"Preparing text knowledge base: {knowledge_file_path}")
+                data.decode("utf-8")
+                knowledge_doc = (f"{upload_name}.txt", data, "text/plain")
+                logger.info("Preparing text knowledge base: %s", knowledge_file_path)
 
             except UnicodeDecodeError:
                 # If it's not a valid text file and not a PDF, treat as binary
-                with open(knowledge_file_path, "rb") as knowledge_file:
-                    knowledge_doc = io.BytesIO(knowledge_file.read())
-                    knowledge_doc.name = (
-                        f"{uuid.uuid4().hex}_{os.path.basename(knowledge_file_path)}"
-                    )
-                logger.info(f"Preparing binary knowledge base: {knowledge_file_path}")
+                knowledge_doc = (upload_name, data, "application/octet-stream")
+                logger.info("Preparing binary knowledge base: %s", knowledge_file_path)
 
-        # Upload knowledge document
+        # Upload the already-read bytes using the SDK's (name, content, type) form
         file = client.files.create(
             file=knowledge_doc,
             purpose="assistants",
@@ -140,14 +246,15 @@ def setup_knowledge_base(
 
         vector_store = client.beta.vector_stores.create(file_ids=[file.id])
         tool_resources = {"file_search": {"vector_store_ids": [vector_store.id]}}
-        tools = [{"type": "file_search"}, *FUNCTION_DESCRIPTIONS]
+        tools = list(_TOOLS_WITH_KB)
+        _save_kb_cache(digest, file.id, vector_store.id)
 
-        logger.info(f"Successfully uploaded knowledge base: {knowledge_file_path}")
+        logger.info("Successfully uploaded knowledge base: %s", knowledge_file_path)
         return tools, tool_resources
 
     except Exception as e:
-        logger.error(f"Error setting up knowledge base: {e}")
-        return FUNCTION_DESCRIPTIONS, None
+        logger.error("Error setting up knowledge base: %s", e)
+        return list(_TOOLS_NO_KB), None
 
 
 def create_or_update_assistant(
@@ -173,28 +280,28 @@ def create_or_update_assistant(
         # Try to update existing assistant
         try:
             existing_assistant = client.beta.assistants.retrieve(assistant_id)
-            logger.info(f"Found existing assistant: {assistant_id}")
+            logger.info("Found existing assistant: %s", assistant_id)
 
             # Update the assistant
             updated_assistant = client.beta.assistants.update(
                 assistant_id=assistant_id, **assistant_config
             )
 
-            logger.info(f"Successfully updated assistant: {assistant_id}")
+            logger.info("Successfully updated assistant: %s", assistant_id)
             return updated_assistant.id
 
         except Exception as e:
-            logger.warning(f"Failed to update assistant {assistant_id}: {e}")
+            logger.warning("Failed to update assistant %s: %s", assistant_id, e)
             logger.info("Creating new assistant instead")
 
     # Create new assistant
     try:
         assistant = client.beta.assistants.create(**assistant_config)
-        logger.info(f"Created new assistant with ID: {assistant.id}")
+        logger.info("Created new assistant with ID: %s", assistant.id)
         return assistant.id
 
     except Exception as e:
-        logger.error(f"Error creating assistant: {e}")
+        logger.error("Error creating assistant: %s", e)
         raise
 
 
@@ -213,10 +320,10 @@ def create_assistant(client: OpenAI) -> str:
         knowledge_file_path = Config.KNOWLEDGE_BASE_FILE
         instructions_file_path = Config.INSTRUCTIONS_FILE
 
-        logger.info(f"Setting up assistant with:")
-        logger.info(f"  Assistant ID: {assistant_id or 'None (will create new)'}")
-        logger.info(f"  Knowledge file: {knowledge_file_path}")
-        logger.info(f"  Instructions file: {instructions_file_path}")
+        logger.info("Setting up assistant with:")
+        logger.info("  Assistant ID: %s", assistant_id or "None (will create new)")
+        logger.info("  Knowledge file: %s", knowledge_file_path)
+        logger.info("  Instructions file: %s", instructions_file_path)
 
         # Load instructions from file
         instructions = load_instructions_from_file(instructions_file_path)
@@ -234,14 +341,14 @@ def create_assistant(client: OpenAI) -> str:
         try:
             with open(assistant_file_path, "w") as file:
                 json.dump({"assistant_id": final_assistant_id}, file)
-            logger.info(f"Saved assistant ID to {assistant_file_path}")
+            logger.info("Saved assistant ID to %s", assistant_file_path)
         except Exception as e:
-            logger.warning(f"Failed to save assistant ID to file: {e}")
+            logger.warning("Failed to save assistant ID to file: %s", e)
 
         return final_assistant_id
 
     except Exception as e:
-        logger.error(f"Error in create_assistant: {traceback.format_exc()}")
+        logger.error("Error in create_assistant: %s", traceback.format_exc())
         raise
 
 
@@ -250,80 +357,113 @@ def get_conversation(thread_id: str, client: OpenAI = client) -> str:
         if not thread_id:
             return "Error: Thread ID is required"
 
-        logger.info(f"Getting conversation for {thread_id}")
-        messages = list(client.beta.threads.messages.list(thread_id=thread_id))
-        logger.info(f"Retrieved {len(messages)} messages")
+        logger.info("Getting conversation for %s", thread_id)
 
-        if not messages:
+        # Only the newest message is needed to tell whether the thread changed
+        latest = client.beta.threads.messages.list(
+            thread_id=thread_id, limit=1, order="desc"
+        ).data
+        if not latest:
             return "No messages found in conversation"
 
-        conversation_parts = []
-        for message in reversed(messages):
-            if message.content and len(message.content) > 0:
-                content = message.content[0].text.value
-                conversation_parts.append(f"{message.role.upper()}: {content}")
-
-        return "\n".join(conversation_parts)
+        tip = latest[0]
+        if getattr(tip, "status", "completed") != "completed":
+            # The newest message is still being written, don't cache it
+            return _render_conversation.__wrapped__(thread_id, tip.id, client)
+        return _render_conversation(thread_id, tip.id, client)
 
     except Exception as e:
-        logger.error(f"Error retrieving conversation: {traceback.format_exc()}")
+        logger.error("Error retrieving conversation: %s", traceback.format_exc())
         return f"Error retrieving conversation: {str(e)}"
 
 
+@functools.lru_cache(maxsize=1024)
+def _render_conversation(thread_id: str, tip_id: str, client: OpenAI) -> str:
+    """Fetch and format a full conversation, cached on its newest message id"""
+    # Fetch oldest first so the transcript can be joined without reversing
+    messages = client.beta.threads.messages.list(thread_id=thread_id, order="asc")
+    return "\n".join(
+        f"{message.role.upper()}: {message.content[0].text.value}"
+        for message in messages
+        if message.content
+    )
+
+
+# Webhooks are delivered in the background so tool calls return immediately
+_webhook_session = requests.Session()
+_webhook_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+_webhook_session.mount("http://", _webhook_adapter)
+_webhook_session.mount("https://", _webhook_adapter)
+_webhook_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="webhook")
+
+
+def _post_webhook(webhook_url: str, info: dict) -> requests.Response:
+    return _webhook_session.post(
+        webhook_url,
+        data=orjson.dumps(info),
+        headers={"Content-Type": "application/json"},
+        timeout=30,
+    )
+
+
+def send_webhook(label: str, webhook_url: str, info: dict) -> None:
+    """Queue a webhook POST and log its outcome once delivered"""
+
+    def log_result(future: Future) -> None:
+        try:
+            response = future.result()
+            logger.info("%s webhook sent successfully: %s", label, response.status_code)
+        except Exception as e:
+            logger.error("Failed to send %s webhook: %s", label.lower(), e)
+
+    future = _webhook_pool.submit(_post_webhook, webhook_url, info)
+    future.add_done_callback(log_result)
+
+
 def extract_user_info(user_info: str) -> dict:
     """Extract and process user information for appointment booking."""
     try:
-        info = json.loads(user_info)
+        info = orjson.loads(user_info)
 
         # Send webhook to LEAD_WEBHOOK
         webhook_url = os.getenv("LEAD_WEBHOOK")
         if webhook_url:
-            try:
-                response = requests.post(webhook_url, json=info)
-                logger.info(f"Lead webhook sent successfully: {response.status_code}")
-            except Exception as e:
-                logger.error(f"Failed to send lead webhook: {e}")
+            send_webhook("Lead", webhook_url, info)
 
         return {
             "success": True,
             "message": "User information extracted and processed successfully",
             "data": info,
         }
-    except json.JSONDecodeError:
-        logger.error(f"Invalid JSON in user_info: {user_info}")
+    except orjson.JSONDecodeError:
+        logger.error("Invalid JSON in user_info: %s", user_info)
         return {"success": False, "message": "Invalid user information format"}
     except Exception as e:
-        logger.error(f"Error processing user info: {e}")
+        logger.error("Error processing user info: %s", e)
         return {"success": False, "message": "Failed to process user information"}
 
 
 def contact_support(user_info: str) -> dict:
     """Forward user complaint/request to support team."""
     try:
-        info = json.loads(user_info)
+        info = orjson.loads(user_info)
 
         info["email"] = os.getenv("EMAIL_RECIPIENT")
 
         # Send webhook to NOLEAD_WEBHOOK
         webhook_url = os.getenv("NOLEAD_WEBHOOK")
         if webhook_url:
-            try:
-                response = requests.post(webhook_url, json=info)
-                logger.info(
-                    f"Support webhook sent successfully: {response.status_code}"
-                )
-            except Exception as e:
-                logger.error(f"Failed to send support webhook: {e}")
+            send_webhook("Support", webhook_url, info)
 
         return {
             "success": True,
             "message": "Your request has been forwarded to our support team. They will contact you shortly.",
         }
-    except json.JSONDecodeError:
-        logger.error(f"Invalid JSON in user_info: {user_info}")
+    except orjson.JSONDecodeError:
+        logger.error("Invalid JSON in user_info: %s", user_info)
         return {"success": False, "message": "Invalid user information format"}
     except Exception as e:
-        logger.error(f"Error contacting support: {e}")
+        logger.error("Error contacting support: %s", e)
         return {"success": False, "message": "Failed to contact support"}
 
 
@@ -365,3 +505,7 @@ FUNCTION_DESCRIPTIONS = [
 ]
 
 FUNCTIONS = {"extract_user_info": extract_user_info, "contact_support": contact_support}
+
+# Tool lists handed to the assistant, built once at import
+_TOOLS_NO_KB = tuple(FUNCTION_DESCRIPTIONS)
+_TOOLS_WITH_KB = ({"type": "file_search"}, *FUNCTION_DESCRIPTIONS)
@@ -1,26 +1,36 @@
 # python imports
 import os
-import json
+import re
+import logging
 import time
+import functools
+import threading
 import traceback
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 
 # installed imports
 import openai
+import orjson
+import msgspec
 from openai import OpenAI
-from packaging import version
 from flask import Blueprint, request, jsonify
-from marshmallow import Schema, fields, ValidationError
+
+try:
+    from openai import AssistantEventHandler
+except ImportError:  # openai < 1.14 has no streaming helpers
+    AssistantEventHandler = None
 
 # local imports
 from . import logger
-from .functions import create_assistant, get_conversation, FUNCTIONS
+from .functions import create_assistant, get_conversation, http_client, FUNCTIONS
 
 TIMEZONE = os.getenv("TIMEZONE", "America/New_York")
 
 # Check OpenAI version compatibility
-required_version = version.parse("1.1.1")
-current_version = version.parse(openai.__version__)
+required_version = (1, 1, 1)
+current_version = tuple(
+    int(part) for part in openai.__version__.split(".")[:3] if part.isdigit()
+)
 
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
@@ -40,20 +50,44 @@ wait = {}
 COOLDOWN = 10
 
 # Initialize OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = OpenAI(api_key=OPENAI_API_KEY, http_client=http_client)
+
+# Assistant is created or loaded lazily, see get_assistant_id
+_assistant_lock = threading.Lock()
+_setup_started = threading.Event()
+
+
+@functools.cache
+def _load_assistant_id() -> str:
+    return create_assistant(client)
 
-# Create or load assistant
-assistant_id = create_assistant(client)
+
+def get_assistant_id() -> str:
+    """Return the assistant ID, creating or updating the assistant on first use"""
+    with _assistant_lock:
+        return _load_assistant_id()
 
 
 # Request validation schemas
-class ChatRequestSchema(Schema):
-    thread_id = fields.String(required=False, allow_none=True)
-    message = fields.String(required=True)
-    stream = fields.Boolean(required=False)  # v2 streaming support
+class ChatRequest(msgspec.Struct, forbid_unknown_fields=True):
+    message: str
+    thread_id: Optional[str] = None
+    stream: bool = False  # v2 streaming support
+
+
+# strict=False accepts "true"/1 for booleans like the old marshmallow schema
+chat_decoder = msgspec.json.Decoder(ChatRequest, strict=False)
+
+_ERROR_FIELD_PATTERN = re.compile(
+    r"(?:required|unknown) field `(\w+)`|- at `\$\.(\w+)`"
+)
 
 
-chat_schema = ChatRequestSchema()
+def validation_details(error: msgspec.DecodeError) -> Dict[str, List[str]]:
+    """Shape a msgspec error as {field: [messages]}, like marshmallow did"""
+    match = _ERROR_FIELD_PATTERN.search(str(error))
+    field = (match.group(1) or match.group(2)) if match else "_schema"
+    return {field: [str(error)]}
 
 
 def handle_api_error(func):
@@ -62,26 +96,140 @@ def handle_api_error(func):
     def wrapper(*args, **kwargs):
         try:
             return func(*args, **kwargs)
-        except ValidationError as e:
-            logger.error(f"Validation error in {func.__name__}: {e.messages}")
+        except msgspec.DecodeError as e:
+            logger.error("Validation error in %s: %s", func.__name__, e)
             return (
-                jsonify({"error": "Invalid request data", "details": e.messages}),
+                jsonify(
+                    {"error": "Invalid request data", "details": validation_details(e)}
+                ),
                 400,
             )
         except Exception as e:
-            logger.error(f"Error in {func.__name__}: {traceback.format_exc()}")
+            logger.error("Error in %s: %s", func.__name__, traceback.format_exc())
             return jsonify({"error": "Internal server error"}), 500
 
     wrapper.__name__ = func.__name__
     return wrapper
 
 
+# Run states after which no further events arrive
+TERMINAL_RUN_STATUSES = ("completed", "failed", "expired", "incomplete", "cancelled")
+TERMINAL_RUN_EVENTS = tuple(f"thread.run.{status}" for status in TERMINAL_RUN_STATUSES)
+
+
+def dumps(obj: Any) -> str:
+    """Serialize an object to a JSON string"""
+    return orjson.dumps(obj).decode()
+
+
+def dispatch_tool_call(tool_call: Any) -> Dict[str, Any]:
+    """Run one requested function call and return its output or an error"""
+    function_name = tool_call.function.name
+    logger.info("Processing function call: %s", function_name)
+
+    function = FUNCTIONS.get(function_name)
+    if function is None:
+        logger.warning("Unknown function: %s", function_name)
+        return {"error": "Function not found"}
+
+    try:
+        output = function(**orjson.loads(tool_call.function.arguments))
+    except (orjson.JSONDecodeError, TypeError) as e:
+        logger.error("Error processing function call: %s", e)
+        return {"error": "Invalid function arguments"}
+
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Function output: %s", output)
+    return output or {"ok": True}
+
+
+def run_tool_calls(tool_calls: List[Any]) -> List[Dict[str, str]]:
+    """Execute the function calls requested by a run and collect their outputs"""
+    return [
+        {"tool_call_id": tool_call.id, "output": dumps(dispatch_tool_call(tool_call))}
+        for tool_call in tool_calls
+    ]
+
+
+if AssistantEventHandler is not None:
+
+    class RunEventHandler(AssistantEventHandler):
+        """Stream run events and answer function calls as they are requested"""
+
+        def on_event(self, event: Any) -> None:
+            if event.event in TERMINAL_RUN_EVENTS:
+                logger.info("Run status: %s", event.data.status)
+            elif event.event == "thread.run.requires_action":
+                run = event.data
+                tool_outputs = run_tool_calls(
+                    run.required_action.submit_tool_outputs.tool_calls
+                )
+                if tool_outputs:
+                    with client.beta.threads.runs.submit_tool_outputs_stream(
+                        thread_id=run.thread_id,
+                        run_id=run.id,
+                        tool_outputs=tool_outputs,
+                        event_handler=RunEventHandler(),
+                    ) as stream:
+                        stream.until_done()
+
+
+def poll_run(thread_id: str, run_id: str) -> None:
+    """Poll a run until it finishes, backing off from 50ms up to 800ms
+
+    Only used with openai SDKs older than 1.14, which lack streaming helpers.
+    """
+    delay = 0.05
+    while True:
+        run_status = client.beta.threads.runs.retrieve(
+            thread_id=thread_id, run_id=run_id
+        )
+        logger.info("Run status: %s", run_status.status)
+
+        if run_status.status in TERMINAL_RUN_STATUSES:
+            break
+        elif run_status.status == "requires_action":
+            # Handle function calls
+            tool_outputs = run_tool_calls(
+                run_status.required_action.submit_tool_outputs.tool_calls
+            )
+
+            # Submit tool outputs
+            if tool_outputs:
+                client.beta.threads.runs.submit_tool_outputs(
+                    thread_id=thread_id,
+                    run_id=run_id,
+                    tool_outputs=tool_outputs,
+                )
+                delay = 0.05
+                continue
+
+        time.sleep(delay)
+        delay = min(delay * 2, 0.8)
+
+
+@chatbot.before_app_request
+def start_assistant_setup() -> None:
+    """Start assistant setup in the background on a process's first request
+
+    This runs in the serving process rather than in create_app, so a
+    gunicorn --preload master never holds the assistant lock or an in-flight
+    OpenAI connection when it forks workers.
+    """
+    if _setup_started.is_set():
+        return
+    _setup_started.set()
+    threading.Thread(
+        target=get_assistant_id, name="assistant-setup", daemon=True
+    ).start()
+
+
 # Start conversation thread
 @chatbot.route("/start", methods=["GET"])
 def start_conversation():
     logger.info("Starting a new conversation...")
     thread = client.beta.threads.create()
-    logger.info(f"New thread created with ID: {thread.id}")
+    logger.info("New thread created with ID: %s", thread.id)
     return jsonify({"thread_id": thread.id})
 
 
@@ -89,20 +237,20 @@ def start_conversation():
 @chatbot.route("/chat", methods=["POST"])
 @handle_api_error
 def chat() -> Tuple[Dict[str, Any], int]:
-    data = chat_schema.load(request.get_json())
+    data = chat_decoder.decode(request.get_data())
 
-    thread_id = data.get("thread_id")
-    user_input = data.get("message", "")
+    thread_id = data.thread_id
+    user_input = data.message
 
     if not thread_id:
         # Create thread
         logger.info("Creating thread ID")
         thread = client.beta.threads.create()
         thread_id = thread.id
-        logger.info(f"New thread created with ID: {thread.id}")
+        logger.info("New thread created with ID: %s", thread.id)
         return jsonify({"error": "Missing thread_id"}), 400
 
-    logger.info(f"Received message: {user_input} for thread ID: {thread_id}")
+    logger.info("Received message: %s for thread ID: %s", user_input, thread_id)
 
     # Add message to thread
     client.beta.threads.messages.create(
@@ -110,77 +258,32 @@ def chat() -> Tuple[Dict[str, Any], int]:
     )
 
     # Run the Assistant with v2 features
-    run = client.beta.threads.runs.create(
-        thread_id=thread_id,
-        assistant_id=assistant_id,
-        max_completion_tokens=1000,  # Token control for cost management
-        temperature=0.1,  # Consistent responses
-    )
-
-    while True:
-        run_status = client.beta.threads.runs.retrieve(
-            thread_id=thread_id, run_id=run.id
-        )
-        logger.info(f"Run status: {run_status.status}")
-
-        if run_status.status in ["completed", "failed", "expired"]:
-            break
-        elif run_status.status == "requires_action":
-            # Handle function calls
-            tool_outputs = []
-            for tool_call in run_status.required_action.submit_tool_outputs.tool_calls:
-                logger.info(f"Processing function call: {tool_call.function.name}")
-
-                function_name = tool_call.function.name
-                if function_name in FUNCTIONS:
-                    try:
-                        arguments = json.loads(tool_call.function.arguments)
-                        output = FUNCTIONS[function_name](**arguments)
-                        if output:
-                            logger.info(f"Function output: {output}")
-                            tool_outputs.append(
-                                {
-                                    "tool_call_id": tool_call.id,
-                                    "output": json.dumps(output),
-                                }
-                            )
-                    except (json.JSONDecodeError, TypeError) as e:
-                        logger.error(f"Error processing function call: {e}")
-                        tool_outputs.append(
-                            {
-                                "tool_call_id": tool_call.id,
-                                "output": json.dumps(
-                                    {"error": "Invalid function arguments"}
-                                ),
-                            }
-                        )
-                else:
-                    logger.warning(f"Unknown function: {function_name}")
-                    tool_outputs.append(
-                        {
-                            "tool_call_id": tool_call.id,
-                            "output": json.dumps({"error": "Function not found"}),
-                        }
-                    )
-
-            # Submit tool outputs
-            if tool_outputs:
-                client.beta.threads.runs.submit_tool_outputs(
-                    thread_id=thread_id,
-                    run_id=run.id,
-                    tool_outputs=tool_outputs,
-                )
-
-        time.sleep(1)
+    run_params = {
+        "thread_id": thread_id,
+        "assistant_id": get_assistant_id(),
+        "max_completion_tokens": 1000,  # Token control for cost management
+        "temperature": 0.1,  # Consistent responses
+    }
+
+    if AssistantEventHandler is not None:
+        with client.beta.threads.runs.stream(
+            **run_params, event_handler=RunEventHandler()
+        ) as stream:
+            stream.until_done()
+    else:
+        run = client.beta.threads.runs.create(**run_params)
+        poll_run(thread_id, run.id)
 
     # Retrieve the latest message from the assistant
-    messages = client.beta.threads.messages.list(thread_id=thread_id)
+    messages = client.beta.threads.messages.list(
+        thread_id=thread_id, limit=1, order="desc"
+    )
     if not messages.data:
         logger.error("No messages found in thread")
         return jsonify({"error": "No response generated"}), 500
 
     response = messages.data[0].content[0].text.value
-    logger.info(f"Assistant response: {response}")
+    logger.info("Assistant response: %s", response)
 
     return jsonify({"response": response, "thread_id": thread_id}), 200
 
@@ -191,6 +294,6 @@ def retrieve_conversation(thread_id: str) -> Tuple[Dict[str, Any], int]:
     if not thread_id or not thread_id.strip():
         return jsonify({"error": "Invalid thread_id"}), 400
 
-    logger.info(f"Getting conversation context for {thread_id}")
+    logger.info("Getting conversation context for %s", thread_id)
     conversation = get_conversation(thread_id)
     return jsonify({"conversation": conversation}), 200